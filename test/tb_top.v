@@ -0,0 +1,79 @@
+`default_nettype none
+`timescale 1ns / 1ps
+
+/* Thin cocotb wrapper around the Tiny Tapeout top module.
+   The clock is generated here instead of from Python, so the simulator does
+   not call back into cocotb on every edge. Run with +PY_CLOCK to leave `clk`
+   undriven and let the test start a cocotb Clock instead.
+*/
+module tb_top ();
+
+  parameter CLK_PERIOD_NS /*verilator public*/ = 10;  // read by test.py over VPI
+  parameter KICK_PERIOD = 10000;  // Cycles between automatic watchdog kicks
+
+  // Wire up the inputs and outputs:
+  reg clk;
+  reg rst_n;
+  reg ena;
+  reg [7:0] ui_in;
+  reg [7:0] uio_in;
+  wire [7:0] uo_out;
+  wire [7:0] uio_out;
+  wire [7:0] uio_oe;
+`ifdef GL_TEST
+  wire VPWR = 1'b1;
+  wire VGND = 1'b0;
+`endif
+
+  // Clock generation
+  initial begin
+    if (!$test$plusargs("PY_CLOCK")) begin
+      clk = 1'b0;
+      forever #(CLK_PERIOD_NS / 2) clk = ~clk;
+    end
+  end
+
+  // Free-running watchdog kicker, enabled from cocotb through auto_kick_en.
+  // It ORs a one-cycle pulse onto WDG_KICK (ui_in[3]) every KICK_PERIOD
+  // cycles, the first one right after it is enabled.
+  reg auto_kick_en;
+  reg auto_kick;
+  reg [$clog2(KICK_PERIOD)-1:0] kick_cnt;  // counts 0 .. KICK_PERIOD-1
+
+  initial begin
+    auto_kick_en = 1'b0;
+    auto_kick    = 1'b0;
+  end
+
+  always @(posedge clk) begin
+    if (!auto_kick_en) begin
+      kick_cnt  <= KICK_PERIOD - 1;
+      auto_kick <= 1'b0;
+    end else if (kick_cnt == KICK_PERIOD - 1) begin
+      kick_cnt  <= 0;
+      auto_kick <= 1'b1;
+    end else begin
+      kick_cnt  <= kick_cnt + 1;
+      auto_kick <= 1'b0;
+    end
+  end
+
+  tt_um_example user_project (
+
+      // Include power ports for the Gate Level test:
+`ifdef GL_TEST
+      .VPWR(VPWR),
+      .VGND(VGND),
+`endif
+
+      .ui_in  ({ui_in[7:4], ui_in[3] | auto_kick, ui_in[2:0]}),  // Dedicated inputs
+      .uo_out (uo_out),   // Dedicated outputs
+      .uio_in (uio_in),   // IOs: Input path
+      .uio_out(uio_out),  // IOs: Output path
+      .uio_oe (uio_oe),   // IOs: Enable path (active high: 0=input, 1=output)
+      .ena    (ena),      // enable - goes high when design is selected
+      .clk    (clk),      // clock
+      .rst_n  (rst_n)     // not reset
+  );
+
+endmodule
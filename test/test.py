@@ -1,127 +1,158 @@
 #!/usr/bin/env python3
 """Compact Cocotb ESD Controller Test Suite"""
 
+import os
+
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.triggers import ClockCycles, Timer
+
+# Set COCOTB_ESD_DEBUG=1 to cross-check the ui_in shadow against the bus
+_DEBUG = bool(os.environ.get("COCOTB_ESD_DEBUG"))
+# Set by `make PERF=1`: only failing checks are logged
+_PERF = bool(os.environ.get("COCOTB_ESD_PERF"))
 
 class ESDTester:
+    ESTOP_A_MASK = 1 << 0   # ui_in[0]
+    ESTOP_B_MASK = 1 << 1   # ui_in[1]
+    ACK_MASK = 1 << 2       # ui_in[2]
+    WDG_KICK_MASK = 1 << 3  # ui_in[3]
+
+    SHUTDOWN_MASK = 1 << 0  # uo_out[0]
+    LED_MASK = 1 << 1       # uo_out[1]
+
     def __init__(self, dut):
         self.dut = dut
         self.log = dut._log
+        self.clk_period_ns = int(dut.CLK_PERIOD_NS.value)  # parameter of tb_top.v
+        self._uo_out = dut.uo_out  # resolved once, read on every check
+        self._ui_in_shadow = 0  # last value written to ui_in, so helpers never read it back
+        self.passed = 0
+        self.total = 0
+
+    def _check_shadow(self):
+        if _DEBUG:
+            assert self._ui_in_shadow == int(self.dut.ui_in.value), "ui_in shadow out of sync"
+
+    def write_ui_in(self, value):
+        self._ui_in_shadow = value
+        self.dut.ui_in.value = value
+
+    def set_inputs(self, estop_a=None, estop_b=None, ack=None, wdg=None):
+        """Set any of the input pin levels with a single write to ui_in."""
+        value = self._ui_in_shadow
+        if estop_a is not None:
+            value = (value | self.ESTOP_A_MASK) if estop_a else (value & ~self.ESTOP_A_MASK)
+        if estop_b is not None:
+            value = (value | self.ESTOP_B_MASK) if estop_b else (value & ~self.ESTOP_B_MASK)
+        if ack is not None:
+            value = (value | self.ACK_MASK) if ack else (value & ~self.ACK_MASK)
+        if wdg is not None:
+            value = (value | self.WDG_KICK_MASK) if wdg else (value & ~self.WDG_KICK_MASK)
+        self.write_ui_in(value)
 
     async def reset_dut(self):
         self.log.info("Resetting DUT...")
         self.dut.rst_n.value = 0
         await ClockCycles(self.dut.clk, 5)
+        self._check_shadow()
         self.dut.rst_n.value = 1
         await ClockCycles(self.dut.clk, 5)
 
-    async def pulse_ack(self):
+    async def wait_cycles(self, cycles):
+        """Let `cycles` clock periods pass with a single Timer instead of one trigger per edge."""
+        await Timer(cycles * self.clk_period_ns, units="ns")
+
+    async def pulse_ack(self, release=0):
+        """Pulse ACK, also raising the ui_in bits in `release` (e.g. an E-STOP mask) on the first write."""
         self.log.info("Pulsing ACK")
-        self.dut.ui_in.value = self.dut.ui_in.value & 0xFB  # clear bit 2
-        await ClockCycles(self.dut.clk, 2)
-        self.dut.ui_in.value = self.dut.ui_in.value | 0x04  # set bit 2
-        await ClockCycles(self.dut.clk, 2)
-
-    async def kick_watchdog(self):
-        self.dut.ui_in.value = self.dut.ui_in.value | 0x08  # set bit 3
-        await ClockCycles(self.dut.clk, 1)
-        self.dut.ui_in.value = self.dut.ui_in.value & 0xF7  # clear bit 3
-
-    def set_estop(self, a=None, b=None):
-        if a is not None:
-            self.dut.ui_in.value = (self.dut.ui_in.value & 0xFE) | (a & 0x1)  # bit 0
-        if b is not None:
-            self.dut.ui_in.value = (self.dut.ui_in.value & 0xFD) | ((b & 0x1) << 1)  # bit 1
-
-    async def auto_kick(self, cycles):
-        self.log.info(f"Auto kicking watchdog every ~10k cycles for {cycles} total")
-        for _ in range(cycles // 10000):
-            await self.kick_watchdog()
-            await ClockCycles(self.dut.clk, 9998)
+        base = self._ui_in_shadow | release
+        self.write_ui_in(base & ~self.ACK_MASK)
+        await self.wait_cycles(2)
+        self.write_ui_in(base | self.ACK_MASK)  # the caller's next wait covers the ACK release
+
+    def enable_auto_kick(self, enable):
+        """Hand WDG_KICK over to the free-running kicker in tb_top.v, or take it back."""
+        if enable:
+            self.set_inputs(wdg=0)  # kicker needs the pin idle low
+        self.dut.auto_kick_en.value = int(enable)
 
     def check_state(self, name, exp_shutdown, exp_led):
-        uo = int(self.dut.uo_out.value)
-        shutdown = uo & 0x01
-        led = (uo >> 1) & 0x01
+        uo = self._uo_out.value.integer
+        shutdown = 1 if uo & self.SHUTDOWN_MASK else 0
+        led = 1 if uo & self.LED_MASK else 0
         passed = (shutdown == exp_shutdown and led == exp_led)
+        self.total += 1
+        self.passed += passed
+        if passed and _PERF:
+            return passed
         status = "✅ PASS" if passed else "❌ FAIL"
-        self.log.info(f"{status} - {name}: SHUTDOWN={shutdown}, LED={led} (Expected: {exp_shutdown},{exp_led})")
+        self.log.info("%s - %s: SHUTDOWN=%d, LED=%d (Expected: %d,%d)",
+                      status, name, shutdown, led, exp_shutdown, exp_led)
         return passed
 
 @cocotb.test()
 async def test_esd_controller(dut):
     """Comprehensive ESD Controller Test"""
 
-    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
-
     tester = ESDTester(dut)
 
+    # tb_top.v generates the clock unless the fallback was requested
+    if "PY_CLOCK" in cocotb.plusargs:
+        cocotb.start_soon(Clock(dut.clk, tester.clk_period_ns, units="ns").start())
+
     # Initialize
-    dut.ui_in.value = 0x0F  # All inputs high (estop_a=1, estop_b=1, ack=1, kick=1)
+    tester.write_ui_in(0x0F)  # All inputs high (estop_a=1, estop_b=1, ack=1, kick=1)
     dut.ena.value = 1       # Enable always on
-
-    passed = 0
-    total = 0
+    dut.uio_in.value = 0    # Bidirectional pins unused, keep them out of X
 
     # Test 1: Reset
     await tester.reset_dut()
-    await ClockCycles(dut.clk, 20)
-    total += 1
-    if tester.check_state("After Reset", 1, 1): passed += 1
+    await tester.wait_cycles(20)
+    tester.check_state("After Reset", 1, 1)
 
     # Test 2: Acknowledge
     await tester.pulse_ack()
-    await ClockCycles(dut.clk, 20)
-    total += 1
-    if tester.check_state("ACK Pulse", 1, 1): passed += 1
+    await tester.wait_cycles(20)
+    tester.check_state("ACK Pulse", 1, 1)
 
     # Test 3: Normal Running with watchdog kicking
-    kick_task = cocotb.start_soon(tester.auto_kick(100000))
-    await ClockCycles(dut.clk, 1000)
-    total += 1
-    if tester.check_state("Normal Operation", 0, 0): passed += 1
+    tester.enable_auto_kick(True)
+    await tester.wait_cycles(1000)
+    tester.check_state("Normal Operation", 0, 0)
 
     # Test 4: Emergency Stop A
-    tester.set_estop(a=0)
-    kick_task.kill()
-    await ClockCycles(dut.clk, 50)
-    total += 1
-    if tester.check_state("E-STOP A", 1, 1): passed += 1
+    tester.set_inputs(estop_a=0)
+    tester.enable_auto_kick(False)
+    await tester.wait_cycles(50)
+    tester.check_state("E-STOP A", 1, 1)
 
     # Recovery A
-    tester.set_estop(a=1)
-    await tester.pulse_ack()
-    kick_task = cocotb.start_soon(tester.auto_kick(50000))
-    await ClockCycles(dut.clk, 1000)
-    total += 1
-    if tester.check_state("Recovery A", 0, 0): passed += 1
+    await tester.pulse_ack(release=tester.ESTOP_A_MASK)
+    tester.enable_auto_kick(True)
+    await tester.wait_cycles(1000)
+    tester.check_state("Recovery A", 0, 0)
 
     # Test 5: Emergency Stop B
-    tester.set_estop(b=0)
-    kick_task.kill()
-    await ClockCycles(dut.clk, 50)
-    total += 1
-    if tester.check_state("E-STOP B", 1, 1): passed += 1
+    tester.set_inputs(estop_b=0)
+    tester.enable_auto_kick(False)
+    await tester.wait_cycles(50)
+    tester.check_state("E-STOP B", 1, 1)
 
     # Recovery B
-    tester.set_estop(b=1)
-    await tester.pulse_ack()
-    kick_task = cocotb.start_soon(tester.auto_kick(50000))
-    await ClockCycles(dut.clk, 1000)
-    total += 1
-    if tester.check_state("Recovery B", 0, 0): passed += 1
+    await tester.pulse_ack(release=tester.ESTOP_B_MASK)
+    tester.enable_auto_kick(True)
+    await tester.wait_cycles(1000)
+    tester.check_state("Recovery B", 0, 0)
 
     # Test 6: Watchdog timeout
-    kick_task.kill()
-    await ClockCycles(dut.clk, 100000)  # Wait longer than expected
-    total += 1
-    if tester.check_state("Watchdog Timeout", 1, 1): passed += 1
+    tester.enable_auto_kick(False)
+    await tester.wait_cycles(100000)  # Wait longer than expected
+    tester.check_state("Watchdog Timeout", 1, 1)
 
     # Summary
-    tester.log.info(f"=== TEST SUMMARY: {passed}/{total} PASSED ===")
-    if passed == total:
+    tester.log.info("=== TEST SUMMARY: %d/%d PASSED ===", tester.passed, tester.total)
+    if tester.passed == tester.total:
         tester.log.info("🎉 All tests passed successfully!")
     else:
-        tester.log.error(f"❌ {total - passed} test(s) failed.")
+        tester.log.error("❌ %d test(s) failed.", tester.total - tester.passed)